@@ -2,10 +2,27 @@ import requests
 
 url = "http://127.0.0.1:8000/chat"
 user_id = "Nolan"
+session = requests.Session()  # keep one connection alive across messages
+
+def iter_sse(resp):
+    # yields each event's data, joining multi-line data fields back together;
+    # events are split here because iter_lines emits stray blank lines at read boundaries
+    buf = ""
+    for chunk in resp.iter_content(chunk_size=None, decode_unicode=True):
+        buf += chunk
+        while "\n\n" in buf:
+            event, buf = buf.split("\n\n", 1)
+            yield "\n".join(line[len("data: "):] for line in event.split("\n") if line.startswith("data: "))
 
 while True:
     msg = input("You: ")
     if msg.lower() in ("exit", "quit"):
         break
-    resp = requests.post(url, json={"user_id": user_id, "message": msg})
-    print("Gary:", resp.json().get("reply"))
+    resp = session.post(url, json={"user_id": user_id, "message": msg}, stream=True)
+    if resp.status_code != 200:
+        print("Gary:", resp.json().get("detail"))
+        continue
+    print("Gary: ", end="", flush=True)
+    for piece in iter_sse(resp):
+        print(piece, end="", flush=True)
+    print()
@@ -1,16 +1,17 @@
 # gary_api.py
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-import os, json
+import os, asyncio, threading
+import orjson
 from dotenv import load_dotenv
 import openai
 
 load_dotenv()
 OPENAI_KEY = os.getenv("OPENAI_API_KEY") or ""
-if OPENAI_KEY:
-    openai.api_key = OPENAI_KEY
+openai_client = openai.AsyncOpenAI(api_key=OPENAI_KEY) if OPENAI_KEY else None
 
 app = FastAPI(title="ElegantAI")
 
@@ -31,48 +32,73 @@ class ChatRequest(BaseModel):
 
 # --------- Memory ---------
 MEMORY_FILE = "memory.json"
+_memory_lock = threading.Lock()  # /remember runs in the threadpool; serialize load-modify-save
+
+def load_memory():
+    with open(MEMORY_FILE, "rb") as f:
+        return orjson.loads(f.read())
+
+def save_memory(mem: dict):
+    # write to a temp file and rename so readers never see a torn file
+    tmp = f"{MEMORY_FILE}.{threading.get_ident()}.tmp"
+    data = orjson.dumps(mem, option=orjson.OPT_INDENT_2)
+    with open(tmp, "wb", buffering=64 * 1024) as f:
+        f.write(data)
+    os.replace(tmp, MEMORY_FILE)
+
 if not os.path.exists(MEMORY_FILE):
-    json.dump({"facts": [], "personality": ""}, open(MEMORY_FILE, "w"))
+    save_memory({"facts": [], "personality": ""})
 
 def recall_context():
-    mem = json.load(open(MEMORY_FILE, "r"))
+    mem = load_memory()
     return " ".join(mem.get("facts", []))
 
 def remember_fact(fact: str):
     fact = fact.strip()
     if not fact:
         return False
-    mem = json.load(open(MEMORY_FILE, "r"))
-    mem.setdefault("facts", [])
-    mem["facts"].append(fact)
-    json.dump(mem, open(MEMORY_FILE, "w"))
+    with _memory_lock:
+        mem = load_memory()
+        mem.setdefault("facts", [])
+        mem["facts"].append(fact)
+        save_memory(mem)
     return True
 
 # --------- OpenAI Chat ---------
-def ask_openai(prompt: str) -> str:
+async def ask_openai(prompt: str):
+    """Async generator yielding the reply in pieces as the model streams it."""
     if not OPENAI_KEY:
-        return "(offline) " + prompt[::-1]
+        yield "(offline) " + prompt[::-1]
+        return
     try:
-        resp = openai.ChatCompletion.create(
+        stream = await openai_client.chat.completions.create(
             model="gpt-5-mini",
             messages=[
                 {"role":"system","content":"You are ElegantAI, friendly, elegant, and witty."},
                 {"role":"user","content":prompt}
             ],
             max_completion_tokens=1000,
-            temperature=0.9
+            temperature=0.9,
+            stream=True
         )
-        return resp.choices[0].message["content"].strip()
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
     except Exception as e:
-        return f"(error) {e}"
+        yield f"(error) {e}"
+
+def _sse(text: str) -> str:
+    # one data: field per line, so newlines inside the reply survive framing
+    return "".join(f"data: {line}\n" for line in text.split("\n")) + "\n"
 
 # --------- API Routes ---------
 @app.post("/chat")
-def chat(req: ChatRequest):
-    context = recall_context()
+async def chat(req: ChatRequest):
+    context = await asyncio.to_thread(recall_context)
     prompt = f"{context}\nUser: {req.message}"
     reply = ask_openai(prompt)
-    return {"reply": reply}
+    return StreamingResponse((_sse(piece) async for piece in reply), media_type="text/event-stream")
 
 @app.post("/remember")
 def remember(req: ChatRequest):
@@ -81,5 +107,4 @@ def remember(req: ChatRequest):
 
 @app.get("/memory")
 def get_memory():
-    mem = json.load(open(MEMORY_FILE, "r"))
-    return mem
+    return load_memory()
@@ -8,24 +8,29 @@ ElegantAI — Multi-user Premium AI Assistant
 """
 
 import os
-import json
+import orjson
 import hashlib
 import re
-from datetime import datetime, timedelta
+import asyncio
+import copy
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 import openai
-import requests
+import httpx
 import threading
 
 # ----------------- CONFIG -----------------
 load_dotenv()
 OPENAI_KEY = os.getenv("OPENAI_API_KEY") or ""
 SEARCH_API_KEY = os.getenv("SEARCH_API_KEY") or ""
-openai.api_key = OPENAI_KEY
+openai_client = openai.AsyncOpenAI(api_key=OPENAI_KEY) if OPENAI_KEY else None
 
 DATA_DIR = Path("elegantai_data")
 MEMORY_DIR = DATA_DIR / "memory"
@@ -34,107 +39,189 @@ CHAT_DIR = DATA_DIR / "chat_history"
 CHAT_DIR.mkdir(parents=True, exist_ok=True)
 
 WEB_SEARCH_TIMEOUT = 8
-WEB_SEARCH_RATE_LIMIT_PER_MIN = 6
+WEB_SEARCH_RATE_LIMIT_PER_MIN = 6       # total across all users; caps SEARCH_API_KEY spend
+WEB_SEARCH_USER_RATE_LIMIT_PER_MIN = 3  # per user_id, so one user can't take the whole budget
+RATE_LIMIT_BUCKET_TTL = 300  # seconds before an idle user's bucket is dropped
 MAX_CHAT_MESSAGES = 1000
 MAX_SNIPPET_LENGTH = 800
+MAX_REPLY_LENGTH = 3000
+STREAM_HOLDBACK = 32  # unsent tail of a streamed reply, longer than any bounded forbidden match
+MEMORY_CACHE_SIZE = 10_000
+MAX_FACTS = 200
+MAX_CONTEXT_LENGTH = 16_000
+MEMORY_LOCK_STRIPES = 64
 
 FORBIDDEN_PATTERNS = [
     r"\brm\b", r"\brmdir\b", r"\brm -rf\b", r"\bdel\s+C:\\", r"\bsudo\b", r"\bshutdown\b",
     r"\bformat\b", r"\bpasswd\b", r"\bchown\b", r"\bchmod\b", r"curl\s", r"wget\s",
     r"nc\s", r"ncat\s", r"bash\s", r"exec\(", r"subprocess", r"system\("
 ]
+# one alternation so each text is scanned once instead of once per pattern;
+# IGNORECASE saves lower()-copying every message and model reply
+_FORBIDDEN_RE = re.compile("|".join(f"(?:{p})" for p in FORBIDDEN_PATTERNS), re.IGNORECASE)
+# unfinished prefixes of the unbounded (\s+) forbidden patterns at the end of the text;
+# a streamed reply is held back from their start until they either complete or break off
+_FORBIDDEN_OPEN_TAIL_RE = re.compile(r"\bdel\s+(?:C:?)?\Z", re.IGNORECASE)
+_URL_RE = re.compile(r"https?://\S+")
+_CTRL_RE = re.compile(r"[\x00-\x1f]+")
+_INVALID_QUERY_RE = re.compile(r"[<>\\\x00]")
 
-_search_timestamps = []
+_buckets: dict[str, tuple[float, float]] = {}  # user_id -> (tokens, last_refill)
+_global_bucket = (float(WEB_SEARCH_RATE_LIMIT_PER_MIN), time.monotonic())
+_buckets_lock = threading.Lock()
+_buckets_last_sweep = time.monotonic()
+_mem_cache = OrderedDict()  # user_id -> (st_mtime_ns, memory), LRU order
+_mem_cache_lock = threading.RLock()
+# /memory runs in FastAPI's threadpool; a striped lock per user keeps load-modify-save
+# updates from overwriting each other without a lock object per user
+_memory_locks = [threading.Lock() for _ in range(MEMORY_LOCK_STRIPES)]
+_http_client: Optional[httpx.AsyncClient] = None  # opened/closed by the app lifespan
 
 # ----------------- UTILS -----------------
 def clamp_text(s: str, max_len: int):
     return s if len(s) <= max_len else s[:max_len] + "..."
 
 def is_forbidden_input(text: str) -> bool:
-    t = text.lower()
-    for p in FORBIDDEN_PATTERNS:
-        if re.search(p, t):
-            return True
-    return False
-
-def rate_limit_allows():
-    global _search_timestamps
-    now = datetime.utcnow()
-    cutoff = now - timedelta(minutes=1)
-    _search_timestamps = [t for t in _search_timestamps if t > cutoff]
-    return len(_search_timestamps) < WEB_SEARCH_RATE_LIMIT_PER_MIN
-
-def register_search_timestamp():
-    _search_timestamps.append(datetime.utcnow())
+    return _FORBIDDEN_RE.search(text) is not None
+
+def _sweep_buckets(now: float):
+    # idle buckets are full again anyway, so dropping them changes nothing
+    global _buckets_last_sweep
+    if now - _buckets_last_sweep < RATE_LIMIT_BUCKET_TTL:
+        return
+    _buckets_last_sweep = now
+    cutoff = now - RATE_LIMIT_BUCKET_TTL
+    for uid in [u for u, (_, ts) in _buckets.items() if ts < cutoff]:
+        del _buckets[uid]
+
+def _refill(bucket: tuple[float, float], limit: int, now: float) -> float:
+    # token bucket: refills `limit` tokens per minute, capped at `limit`
+    tokens, ts = bucket
+    return min(limit, tokens + (now - ts) * (limit / 60.0))
+
+def rate_limit_allows(user_id: str):
+    # user_id is client-supplied, so a search needs a token from both the
+    # user's bucket and the global one; each search takes one from each
+    global _global_bucket
+    user_limit = WEB_SEARCH_USER_RATE_LIMIT_PER_MIN
+    with _buckets_lock:
+        now = time.monotonic()
+        _sweep_buckets(now)
+        user_tokens = _refill(_buckets.get(user_id, (float(user_limit), now)), user_limit, now)
+        global_tokens = _refill(_global_bucket, WEB_SEARCH_RATE_LIMIT_PER_MIN, now)
+        allowed = user_tokens >= 1 and global_tokens >= 1
+        if allowed:
+            user_tokens -= 1
+            global_tokens -= 1
+        _buckets[user_id] = (user_tokens, now)
+        _global_bucket = (global_tokens, now)
+    return allowed
 
 # ----------------- MEMORY -----------------
 def get_memory_path(user_id: str):
     return MEMORY_DIR / f"{user_id}.json"
 
-def load_memory(user_id: str):
+def _cache_memory(user_id: str, mtime_ns: int, memory: dict):
+    with _mem_cache_lock:
+        _mem_cache[user_id] = (mtime_ns, memory)
+        _mem_cache.move_to_end(user_id)
+        while len(_mem_cache) > MEMORY_CACHE_SIZE:
+            _mem_cache.popitem(last=False)
+
+def _facts_context(facts) -> str:
+    return " ".join(facts)[-MAX_CONTEXT_LENGTH:]
+
+def _load_memory_shared(user_id: str):
+    # returns the cached dict itself; callers must not mutate it
     path = get_memory_path(user_id)
-    if path.exists():
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {"facts": [], "personality": ""}
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return {"facts": [], "personality": "", "context_cache": ""}
+    with _mem_cache_lock:
+        cached = _mem_cache.get(user_id)
+        if cached and cached[0] == st.st_mtime_ns:
+            _mem_cache.move_to_end(user_id)
+            return cached[1]
+    memory = orjson.loads(path.read_bytes())
+    if "context_cache" not in memory:  # files written before context_cache existed
+        memory["context_cache"] = _facts_context(memory.get("facts", [])[-MAX_FACTS:])
+    _cache_memory(user_id, st.st_mtime_ns, memory)
+    return memory
+
+def load_memory(user_id: str):
+    return copy.deepcopy(_load_memory_shared(user_id))
 
 def save_memory(user_id: str, memory: dict):
+    # write to a temp file and rename so readers never see a torn file
     path = get_memory_path(user_id)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(memory, f, indent=2, ensure_ascii=False)
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    data = orjson.dumps(memory, option=orjson.OPT_INDENT_2)
+    with open(tmp, "wb", buffering=64 * 1024) as f:
+        f.write(data)
+    os.replace(tmp, path)
+    _cache_memory(user_id, path.stat().st_mtime_ns, copy.deepcopy(memory))
+
+def _memory_lock(user_id: str):
+    return _memory_locks[hash(user_id) % MEMORY_LOCK_STRIPES]
 
 def remember_fact(user_id: str, fact: str):
     if is_forbidden_input(fact): return False
-    memory = load_memory(user_id)
-    memory.setdefault("facts", []).append(clamp_text(fact, 1000))
-    save_memory(user_id, memory)
+    with _memory_lock(user_id):
+        memory = load_memory(user_id)
+        facts = deque(memory.get("facts", []), maxlen=MAX_FACTS)
+        facts.append(clamp_text(fact, 1000))
+        memory["facts"] = list(facts)
+        memory["context_cache"] = _facts_context(facts)
+        save_memory(user_id, memory)
     return True
 
 def set_personality(user_id: str, personality: str):
     if is_forbidden_input(personality): return False
-    memory = load_memory(user_id)
-    memory["personality"] = clamp_text(personality, 1000)
-    save_memory(user_id, memory)
+    with _memory_lock(user_id):
+        memory = load_memory(user_id)
+        memory["personality"] = clamp_text(personality, 1000)
+        save_memory(user_id, memory)
     return True
 
 def recall_context(user_id: str) -> str:
-    memory = load_memory(user_id)
-    facts = " ".join(memory.get("facts", [])[:200])
+    memory = _load_memory_shared(user_id)
     personality = memory.get("personality", "")
-    return f"{personality} {facts}".strip()
+    return f"{personality} {memory['context_cache']}".strip()
 
 # ----------------- WEB SEARCH -----------------
 def safe_snippet_from_serpapi(resp_json):
     try:
         if "organic_results" in resp_json and resp_json["organic_results"]:
             snippet = resp_json["organic_results"][0].get("snippet", "")
-            snippet = re.sub(r"https?://\S+", "[link]", snippet)
-            snippet = re.sub(r"[\x00-\x1f]+", " ", snippet)
+            snippet = _URL_RE.sub("[link]", snippet)
+            snippet = _CTRL_RE.sub(" ", snippet)
             return clamp_text(snippet, MAX_SNIPPET_LENGTH)
     except:
         pass
     return "(no web snippet)"
 
-def web_search_safe(query: str) -> str:
+async def web_search_safe(query: str, user_id: str) -> str:
     if not SEARCH_API_KEY: return "(web search disabled)"
-    if not rate_limit_allows(): return "(rate limit reached)"
-    if re.search(r"[<>\\\x00]", query): return "(invalid characters)"
+    if _INVALID_QUERY_RE.search(query): return "(invalid characters)"
+    if not rate_limit_allows(user_id): return "(rate limit reached)"
     try:
-        register_search_timestamp()
         params = {"q": query, "api_key": SEARCH_API_KEY}
-        resp = requests.get("https://serpapi.com/search.json", params=params, timeout=WEB_SEARCH_TIMEOUT)
+        resp = await _http_client.get("https://serpapi.com/search.json", params=params)
         data = resp.json()
         return safe_snippet_from_serpapi(data)
     except:
         return "(web search error)"
 
 # ----------------- OPENAI -----------------
-def ask_openai(prompt: str, user_id: str, premium: bool = False, use_search: bool = False) -> str:
+async def ask_openai(prompt: str, user_id: str, premium: bool = False, use_search: bool = False):
+    """Async generator yielding the reply in pieces as the model streams it."""
     if not OPENAI_KEY:
-        return "(offline) " + clamp_text(prompt[::-1], 500)
+        yield "(offline) " + clamp_text(prompt[::-1], 500)
+        return
 
     model = "gpt-5" if premium else "gpt-5-mini"
-    context = recall_context(user_id)
+    context = await asyncio.to_thread(recall_context, user_id)
     system_msg = (
         f"You are ElegantAI, a premium personal AI assistant. "
         f"User nickname: {user_id}. Keep a chill, confident, and lively tone. "
@@ -143,28 +230,67 @@ def ask_openai(prompt: str, user_id: str, premium: bool = False, use_search: boo
 
     user_prompt = prompt
     if use_search:
-        snippet = web_search_safe(prompt)
+        snippet = await web_search_safe(prompt, user_id)
         user_prompt += f"\n\nWeb search snippet:\n{snippet}"
 
     try:
-        resp = openai.ChatCompletion.create(
+        stream = await openai_client.chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": system_msg},
                 {"role": "user", "content": user_prompt}
             ],
             max_completion_tokens=1000,
-            temperature=1
+            temperature=1,
+            stream=True
         )
-        text = resp.choices[0].message["content"].strip()
+        text, sent = "", 0
+        async with stream:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text += chunk.choices[0].delta.content or ""
+                if len(text) > MAX_REPLY_LENGTH:
+                    break
+                if not sent:
+                    text = text.lstrip()
+                # a match touching the end may still be a prefix of a longer word ("format" -> "formatted")
+                scan_from = max(0, sent - STREAM_HOLDBACK)
+                m = _FORBIDDEN_RE.search(text, scan_from)
+                if m and m.end() < len(text):
+                    yield "(blocked) Unsafe content."
+                    return
+                safe_end = len(text) - STREAM_HOLDBACK
+                tail = _FORBIDDEN_OPEN_TAIL_RE.search(text, scan_from)
+                if tail:
+                    safe_end = min(safe_end, tail.start())
+                if safe_end > sent:
+                    yield text[sent:safe_end]
+                    sent = safe_end
+        text = text.rstrip()
         if is_forbidden_input(text):
-            return "(blocked) Unsafe content."
-        return clamp_text(text, 3000)
+            yield "(blocked) Unsafe content."
+            return
+        yield clamp_text(text, MAX_REPLY_LENGTH)[sent:]
     except Exception as e:
-        return f"(AI error: {e})"
+        yield f"(AI error: {e})"
+
+def _sse(text: str) -> str:
+    # one data: field per line, so newlines inside the reply survive framing
+    return "".join(f"data: {line}\n" for line in text.split("\n")) + "\n"
 
 # ----------------- FASTAPI -----------------
-app = FastAPI(title="ElegantAI API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _http_client
+    _http_client = httpx.AsyncClient(timeout=WEB_SEARCH_TIMEOUT)
+    try:
+        yield
+    finally:
+        await _http_client.aclose()
+        _http_client = None
+
+app = FastAPI(title="ElegantAI API", lifespan=lifespan)
 
 class ChatRequest(BaseModel):
     user_id: str
@@ -178,11 +304,11 @@ class MemoryRequest(BaseModel):
     personality: Optional[str] = None
 
 @app.post("/chat")
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
     if is_forbidden_input(req.message):
         raise HTTPException(status_code=400, detail="Forbidden input detected")
-    response = ask_openai(req.message, req.user_id, premium=req.premium, use_search=req.use_search)
-    return {"reply": response}
+    reply = ask_openai(req.message, req.user_id, premium=req.premium, use_search=req.use_search)
+    return StreamingResponse((_sse(piece) async for piece in reply), media_type="text/event-stream")
 
 @app.post("/memory")
 def memory(req: MemoryRequest):
@@ -195,6 +321,15 @@ def memory(req: MemoryRequest):
     return {"ok": False, "type": "none"}
 
 @app.get("/memory/{user_id}")
-def get_memory(user_id: str):
-    return load_memory(user_id)
+def get_memory(user_id: str, request: Request):
+    # the file's mtime doubles as an ETag so polling clients get 304s while it's unchanged
+    try:
+        etag = f'"{get_memory_path(user_id).stat().st_mtime_ns}"'
+    except FileNotFoundError:
+        etag = None
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    memory = {k: v for k, v in _load_memory_shared(user_id).items() if k != "context_cache"}
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} if etag else None
+    return JSONResponse(memory, headers=headers)
 
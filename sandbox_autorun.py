@@ -6,6 +6,8 @@ import threading
 import time
 import json
 import os
+import logging
+import sys
 from pathlib import Path
 from sandbox_manager import run_project_by_name, run_code_snippet, list_projects
 import random
@@ -23,8 +25,9 @@ AUTORUN_CONFIG = {
 # ---------- STATE ----------
 _state = {
     "last_activity_ts": time.time(),
-    "running": True
 }
+_stop = threading.Event()  # set by stop_autorun; also wakes the loop out of its sleep
+_pending_scan = {"mtime_ns": None, "files": []}
 
 # ---------- PATHS ----------
 BASE_DIR = Path(__file__).resolve().parent
@@ -32,58 +35,79 @@ PENDING_DIR = BASE_DIR / "sandbox" / "pending"
 LOG_FILE = BASE_DIR / "sandbox_autorun.log"
 PENDING_DIR.mkdir(parents=True, exist_ok=True)
 
+# ---------- LOGGING ----------
+# one long-lived handler per destination instead of reopening the log file per line
+logger = logging.getLogger("autorun")
+if not logger.handlers:
+    _formatter = logging.Formatter("%(asctime)s %(message)s", datefmt="[%Y-%m-%d %H:%M:%S]")
+    for _handler in (logging.StreamHandler(sys.stdout), logging.FileHandler(LOG_FILE, encoding="utf-8", delay=True)):
+        _handler.setFormatter(_formatter)
+        logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
 # ---------- UTILITIES ----------
 def log(message: str):
-    ts = time.strftime("[%Y-%m-%d %H:%M:%S]")
-    line = f"{ts} {message}"
-    print(line)
-    try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    except Exception:
-        pass
+    logger.info(message)
 
 def set_activity_now():
     _state["last_activity_ts"] = time.time()
     log("Activity registered. Resetting idle timer.")
 
+# __TS__ is filled in at generation time, only for templates that use it
+_TASK_TEMPLATES = [
+    b"print('Hello from Gary!')",
+    b"x = sum(range(10)); print('Sum 0-9 =', x)",
+    b"for i in range(3): print('Task iteration', i)",
+    b"print('Gary idle task executed at __TS__')",
+]
+
 def generate_autotask_file():
     """
     Create a simple Python task file for Gary to run.
     """
-    task_templates = [
-        "print('Hello from Gary!')",
-        "x = sum(range(10)); print('Sum 0-9 =', x)",
-        "for i in range(3): print('Task iteration', i)",
-        f"print('Gary idle task executed at {time.strftime('%H:%M:%S')}')",
-    ]
-    code = random.choice(task_templates)
+    code = random.choice(_TASK_TEMPLATES)
+    if b"__TS__" in code:
+        code = code.replace(b"__TS__", time.strftime("%H:%M:%S").encode())
     ts = int(time.time() * 1000)
     fname = PENDING_DIR / f"autotask_{ts}.py"
     try:
-        fname.write_text(code, encoding="utf-8")
+        fname.write_bytes(code)
         log(f"Generated new autotask: {fname.name}")
     except Exception as e:
         log(f"Failed to write autotask: {e}")
 
+def pending_autotasks():
+    """
+    Sorted autotask files in PENDING_DIR. Adding or removing a file bumps the
+    directory's mtime, so the glob only reruns when that has changed.
+    """
+    mtime_ns = PENDING_DIR.stat().st_mtime_ns
+    # a change within the same coarse fs timestamp tick wouldn't move mtime, so recent mtimes always rescan
+    recent = time.time_ns() - mtime_ns < 2_000_000_000
+    if recent or mtime_ns != _pending_scan["mtime_ns"]:
+        _pending_scan["files"] = sorted(PENDING_DIR.glob("autotask_*.py"))
+        _pending_scan["mtime_ns"] = mtime_ns
+    return _pending_scan["files"]
+
 # ---------- AUTORUN LOOP ----------
 def autorun_loop():
-    _state["running"] = True
+    _stop.clear()
     log("Sandbox autorun started.")
     
-    while _state["running"]:
+    while not _stop.is_set():
         try:
             cfg = AUTORUN_CONFIG
             if not cfg["enabled"]:
                 log("Autorun disabled. Sleeping...")
-                time.sleep(cfg["loop_interval"])
+                _stop.wait(cfg["loop_interval"])
                 continue
 
             idle = time.time() - _state["last_activity_ts"]
             log(f"Idle check: {idle:.1f}s")
             if idle < cfg["idle_seconds"]:
                 log("Not idle yet. Skipping this loop.")
-                time.sleep(cfg["loop_interval"])
+                _stop.wait(cfg["loop_interval"])
                 continue
 
             runs = 0
@@ -106,14 +130,14 @@ def autorun_loop():
 
             # ---------- Autotasks ----------
             elif cfg["task_mode"] == "autotasks":
-                pending_files = sorted(PENDING_DIR.glob("autotask_*.py"))
+                pending_files = pending_autotasks()
                 
                 # Generate new tasks if none exist
                 if not pending_files and cfg.get("generate_tasks", False):
                     log("No pending autotasks found. Generating new tasks...")
                     for _ in range(cfg["max_runs_per_cycle"]):
                         generate_autotask_file()
-                    pending_files = sorted(PENDING_DIR.glob("autotask_*.py"))
+                    pending_files = pending_autotasks()
 
                 # Run pending tasks
                 for f in pending_files[:cfg["max_runs_per_cycle"]]:
@@ -136,7 +160,7 @@ def autorun_loop():
         except Exception as e_outer:
             log(f"Autorun loop exception: {e_outer}")
         
-        time.sleep(cfg["loop_interval"])
+        _stop.wait(cfg["loop_interval"])
 
     log("Sandbox autorun stopped.")
 
@@ -147,4 +171,4 @@ def start_autorun_thread():
     return t
 
 def stop_autorun():
-    _state["running"] = False
+    _stop.set()
@@ -5,12 +5,16 @@
 
 import os
 import sys
+import atexit
+import hashlib
 import tempfile
 import uuid
-import json
+import orjson
 import shutil
 import time
+import threading
 import subprocess
+from collections import deque
 from pathlib import Path
 from datetime import datetime
 
@@ -19,13 +23,30 @@ SANDBOX_ROOT = BASE / "sandbox"
 FILES_DIR = SANDBOX_ROOT / "files"
 LOGS_DIR = SANDBOX_ROOT / "logs"
 PENDING_DIR = SANDBOX_ROOT / "pending"
+PROJECT_CACHE_DIR = SANDBOX_ROOT / "cache"
+PROJECT_CACHE_TTL = 3600  # seconds an unused project run dir is kept
+MAX_OUTPUT = 10000  # output kept per run, capped where it's captured
+
+# prewarmed snippet workers (POSIX limits; ignored where `resource` is missing)
+POOL_SIZE = 2
+SNIPPET_MEMORY_LIMIT = 512 * 1024 * 1024
+SNIPPET_MAX_FILES = 64
 
 # ensure directories exist
-for d in (FILES_DIR, LOGS_DIR, PENDING_DIR):
+for d in (FILES_DIR, LOGS_DIR, PENDING_DIR, PROJECT_CACHE_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
-def _timestamp():
-    return datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+_warm = deque()  # started workers waiting for a snippet
+_warm_lock = threading.Lock()
+_last_cache_gc = 0.0
+
+def _timestamp(ns: int = None):
+    """
+    UTC "YYYYmmdd_HHMMSS" for `ns` (a time.time_ns() value), or for now.
+    """
+    if ns is None:
+        ns = time.time_ns()
+    return time.strftime("%Y%m%d_%H%M%S", time.gmtime(ns // 1_000_000_000))
 
 def _safe_env():
     """
@@ -41,54 +62,114 @@ def _safe_env():
     env["PYTHONUNBUFFERED"] = "1"
     return env
 
+# Runs in each `python -I -c` worker: limits are applied and the interpreter is
+# fully started before a snippet arrives; it then reads one snippet from stdin,
+# runs it as __main__ and exits, so nothing carries over between snippets.
+_WORKER_BOOTSTRAP = f"""
+import os, sys, traceback
+try:
+    import resource
+    resource.setrlimit(resource.RLIMIT_AS, ({SNIPPET_MEMORY_LIMIT}, {SNIPPET_MEMORY_LIMIT}))
+    resource.setrlimit(resource.RLIMIT_NOFILE, ({SNIPPET_MAX_FILES}, {SNIPPET_MAX_FILES}))
+except (ImportError, ValueError, OSError):
+    pass
+for stream in (sys.stdout, sys.stderr):
+    stream.reconfigure(encoding="utf-8", errors="backslashreplace")
+path = os.path.abspath("script.py")
+with open(path, "wb") as f:
+    f.write(sys.stdin.buffer.read())
+with open(path, encoding="utf-8") as f:
+    code = f.read()
+sys.argv = [path]
+try:
+    exec(compile(code, path, "exec"), {{"__name__": "__main__", "__file__": path}})
+except SystemExit:
+    raise
+except BaseException as e:
+    traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+    sys.exit(1)
+"""
+
+def _spawn_worker():
+    """
+    Start an isolated (-I, minimal env) worker in its own scratch dir, blocked
+    on stdin until it is handed a snippet. Output goes to an unnamed temp file
+    at the fd level, so os.write(1, ...) and the snippet's child processes are
+    captured too.
+    """
+    tmpdir = tempfile.mkdtemp(prefix="gary_sandbox_")
+    out = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [sys.executable, "-I", "-c", _WORKER_BOOTSTRAP],
+        stdin=subprocess.PIPE, stdout=out, stderr=subprocess.STDOUT,
+        env=_safe_env(), cwd=tmpdir
+    )
+    return {"proc": proc, "tmpdir": tmpdir, "out": out}
+
+def _discard_worker(worker):
+    if worker["proc"].poll() is None:
+        worker["proc"].kill()
+        worker["proc"].wait()
+    worker["out"].close()
+    shutil.rmtree(worker["tmpdir"], ignore_errors=True)
+
+def _take_worker():
+    """
+    Top the pool back up and pop its oldest live worker, so the next
+    snippet's interpreter boots while this one runs.
+    """
+    with _warm_lock:
+        while True:
+            while len(_warm) < POOL_SIZE:
+                _warm.append(_spawn_worker())
+            worker = _warm.popleft()
+            if worker["proc"].poll() is None:
+                return worker
+            _discard_worker(worker)  # died while waiting
+
+@atexit.register
+def _shutdown_workers():
+    with _warm_lock:
+        while _warm:
+            _discard_worker(_warm.popleft())
+
 def run_code_snippet(code: str, timeout: int = 7):
     """
-    Run `code` as a python script inside a temp file in the sandbox.
+    Run `code` in a prewarmed single-use sandbox worker.
     Returns dict with ok/output/error, logs the run.
     """
-    tmpdir = tempfile.mkdtemp(prefix="gary_sandbox_")
-    script_path = Path(tmpdir) / "script.py"
+    worker = None
     try:
-        script_path.write_text(code, encoding="utf-8")
+        worker = _take_worker()
         start = time.time()
-        # Run using sys.executable with -I (isolated mode) to reduce env influence
-        cmd = [sys.executable, "-I", str(script_path)]
-        proc = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            timeout=timeout,
-            text=True,
-            env=_safe_env(),
-            cwd=tmpdir
-        )
+        worker["proc"].communicate(code.encode("utf-8"), timeout=timeout)
         elapsed = time.time() - start
-        out = proc.stdout or ""
+        worker["out"].seek(0)
+        # decode only the kept bytes rather than the whole output
+        out = worker["out"].read(MAX_OUTPUT).decode("utf-8", errors="replace").replace("\r\n", "\n")
         result = {"ok": True, "output": out, "elapsed": elapsed}
     except subprocess.TimeoutExpired:
         result = {"ok": False, "error": "timeout", "output": ""}
     except Exception as e:
         result = {"ok": False, "error": str(e), "output": ""}
     finally:
+        if worker is not None:
+            _discard_worker(worker)
         # write a log file
-        log_name = f"{_timestamp()}_{uuid.uuid4().hex[:6]}.json"
+        now = time.time_ns()
+        log_name = f"{_timestamp(now)}_{uuid.uuid4().hex[:6]}.json"
         log_path = LOGS_DIR / log_name
         log_data = {
-            "ts": _timestamp(),
+            "ts": _timestamp(now),
             "type": "snippet",
             "ok": result.get("ok", False),
             "error": result.get("error"),
             "elapsed": result.get("elapsed"),
-            "output": result.get("output")[:10000],  # cap
+            "output": result.get("output"),
             "code_preview": code[:2000]
         }
         try:
-            log_path.write_text(json.dumps(log_data, indent=2), encoding="utf-8")
-        except Exception:
-            pass
-        # cleanup temp dir
-        try:
-            shutil.rmtree(tmpdir)
+            log_path.write_bytes(orjson.dumps(log_data, option=orjson.OPT_INDENT_2))
         except Exception:
             pass
     return result
@@ -116,6 +197,64 @@ def list_projects():
             })
     return files
 
+def _gc_project_cache():
+    """
+    Remove project run dirs unused for PROJECT_CACHE_TTL. Runs at most once per TTL.
+    """
+    global _last_cache_gc
+    now = time.time()
+    if now - _last_cache_gc < PROJECT_CACHE_TTL:
+        return
+    _last_cache_gc = now
+    for d in PROJECT_CACHE_DIR.iterdir():
+        try:
+            if now - d.stat().st_mtime > PROJECT_CACHE_TTL:
+                shutil.rmtree(d)
+        except Exception:
+            pass
+
+def _remove_path(p: Path):
+    if p.is_dir() and not p.is_symlink():
+        shutil.rmtree(p)
+    else:
+        p.unlink()
+
+def _checkout_run_dir(safe: str, code: bytes, key: str) -> Path:
+    """
+    Claim a private run dir holding only a verified copy of the project.
+    The cached dir for this name + content is renamed to a per-run name, so
+    concurrent runs never share it; whatever the last run left behind is
+    removed and the script is checked against the approved source before reuse.
+    """
+    rundir = PROJECT_CACHE_DIR / f"{key}.{uuid.uuid4().hex[:8]}.run"
+    script_copy = rundir / safe
+    try:
+        os.rename(PROJECT_CACHE_DIR / key, rundir)
+        os.utime(rundir)  # keep _gc_project_cache off it while it runs
+        for p in rundir.iterdir():
+            if p.name != safe or p.is_symlink() or not p.is_file():
+                _remove_path(p)
+        if not script_copy.is_file() or script_copy.read_bytes() != code:
+            script_copy.unlink(missing_ok=True)
+            script_copy.write_bytes(code)
+        return rundir
+    except OSError:
+        # nothing cached, claimed by a concurrent run, or too damaged to clean: start fresh
+        shutil.rmtree(rundir, ignore_errors=True)
+        rundir = Path(tempfile.mkdtemp(prefix=f"{key}.", suffix=".run", dir=PROJECT_CACHE_DIR))
+        (rundir / safe).write_bytes(code)
+        return rundir
+
+def _checkin_run_dir(rundir: Path, key: str):
+    """
+    Put a finished run dir back as the cached copy for `key`, unless another
+    run already has; then this one is just removed.
+    """
+    try:
+        os.rename(rundir, PROJECT_CACHE_DIR / key)
+    except OSError:
+        shutil.rmtree(rundir, ignore_errors=True)
+
 def run_project_by_name(name: str, timeout: int = 10):
     """
     Run a project file from sandbox/files safely (same isolation).
@@ -124,40 +263,39 @@ def run_project_by_name(name: str, timeout: int = 10):
     path = FILES_DIR / safe
     if not path.exists():
         return {"ok": False, "error": "not found"}
-    code = path.read_text(encoding="utf-8")
-    # run via run_code_snippet but set cwd to the files dir to allow relative imports inside sandbox
-    tmpdir = tempfile.mkdtemp(prefix="gary_sandbox_project_")
-    script_copy = Path(tmpdir) / safe
-    script_copy.write_text(code, encoding="utf-8")
+    _gc_project_cache()
+    code = path.read_bytes()
+    key = hashlib.sha1(safe.encode("utf-8") + b"\0" + code).hexdigest()[:16]
+    rundir = _checkout_run_dir(safe, code, key)
+    script_copy = rundir / safe
     try:
         start = time.time()
         cmd = [sys.executable, "-I", str(script_copy)]
         proc = subprocess.run(
             cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-            timeout=timeout, text=True, env=_safe_env(), cwd=tmpdir
+            timeout=timeout, env=_safe_env(), cwd=rundir
         )
         elapsed = time.time() - start
-        out = proc.stdout or ""
+        # decode only the kept bytes rather than the whole output
+        out = (proc.stdout or b"")[:MAX_OUTPUT].decode("utf-8", errors="replace").replace("\r\n", "\n")
         result = {"ok": True, "output": out, "elapsed": elapsed}
     except subprocess.TimeoutExpired:
         result = {"ok": False, "error": "timeout", "output": ""}
     except Exception as e:
         result = {"ok": False, "error": str(e), "output": ""}
     finally:
-        log_name = f"{_timestamp()}_{uuid.uuid4().hex[:6]}.json"
-        (LOGS_DIR / log_name).write_text(json.dumps({
-            "ts": _timestamp(),
+        _checkin_run_dir(rundir, key)
+        now = time.time_ns()
+        log_name = f"{_timestamp(now)}_{uuid.uuid4().hex[:6]}.json"
+        (LOGS_DIR / log_name).write_bytes(orjson.dumps({
+            "ts": _timestamp(now),
             "type": "project",
             "project": safe,
             "ok": result.get("ok", False),
             "error": result.get("error"),
             "elapsed": result.get("elapsed"),
-            "output": result.get("output")[:10000],
-        }, indent=2), encoding="utf-8")
-        try:
-            shutil.rmtree(tmpdir)
-        except Exception:
-            pass
+            "output": result.get("output"),
+        }, option=orjson.OPT_INDENT_2))
     return result
 
 def create_pending_request(name: str, code: str, reason: str = ""):
@@ -165,22 +303,23 @@ def create_pending_request(name: str, code: str, reason: str = ""):
     Gary can request that a file be added to the approved toolset.
     Store it in sandbox/pending as a JSON for you to review.
     """
+    now = time.time_ns()
     req = {
-        "ts": _timestamp(),
+        "ts": _timestamp(now),
         "name": name,
         "reason": reason,
         "code_preview": code[:4000],
         "code_full_path": None
     }
     # save full code file
-    fname = f"{_timestamp()}_{uuid.uuid4().hex[:6]}_{name}"
+    fname = f"{_timestamp(now)}_{uuid.uuid4().hex[:6]}_{name}"
     if not fname.endswith(".py"):
         fname += ".py"
     fullpath = PENDING_DIR / fname
     fullpath.write_text(code, encoding="utf-8")
     req["code_full_path"] = str(fullpath)
     reqpath = PENDING_DIR / (fname + ".request.json")
-    reqpath.write_text(json.dumps(req, indent=2), encoding="utf-8")
+    reqpath.write_bytes(orjson.dumps(req, option=orjson.OPT_INDENT_2))
     return {"ok": True, "request_file": str(reqpath)}
 
 def list_pending_requests():
@@ -188,7 +327,7 @@ def list_pending_requests():
     for p in sorted(PENDING_DIR.iterdir(), reverse=True):
         if p.name.endswith(".request.json"):
             try:
-                obj = json.loads(p.read_text(encoding="utf-8"))
+                obj = orjson.loads(p.read_bytes())
                 out.append({"request_file": str(p), **obj})
             except Exception:
                 continue
@@ -200,7 +339,7 @@ def approve_request(request_file: str, approved_dir: Path = None):
     """
     approved_dir = approved_dir or FILES_DIR
     try:
-        req = json.loads(Path(request_file).read_text(encoding="utf-8"))
+        req = orjson.loads(Path(request_file).read_bytes())
     except Exception as e:
         return {"ok": False, "error": f"bad request file: {e}"}
     code_path = Path(req.get("code_full_path"))
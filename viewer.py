@@ -1,24 +1,59 @@
 # viewer.py
-import os, json, tkinter as tk
+import os, tkinter as tk
+import orjson
 from tkinter import ttk, scrolledtext, messagebox
+from collections import OrderedDict
 from pathlib import Path
 from sandbox_manager import list_projects, run_project_by_name, list_pending_requests, approve_request
 
 BASE = Path(__file__).resolve().parent
 LOGS_DIR = BASE / "sandbox" / "logs"
 PENDING_DIR = BASE / "sandbox" / "pending"
+LOG_PAGE_SIZE = 200
+LOG_CACHE_SIZE = 64
 
-def load_logs():
+_log_cache = OrderedDict()  # file name -> (mtime_ns, text, obj), LRU order
+
+def load_logs(limit: int = LOG_PAGE_SIZE):
+    """
+    Newest-first (name, mtime) for up to `limit` log files.
+    Only stats the files; contents are read on demand by read_log.
+    """
     items = []
     if LOGS_DIR.exists():
-        for p in sorted(LOGS_DIR.iterdir(), reverse=True):
-            if p.suffix == ".json":
-                try:
-                    obj = json.loads(p.read_text(encoding="utf-8"))
-                    items.append((p.name, obj))
-                except Exception:
-                    continue
-    return items
+        with os.scandir(LOGS_DIR) as it:
+            for e in it:
+                if e.name.endswith(".json") and e.is_file():
+                    items.append((e.name, e.stat().st_mtime))
+    items.sort(key=lambda x: x[1], reverse=True)
+    return items[:limit]
+
+def read_log(name: str):
+    """
+    Return (text, obj) for a log file, reusing the cached parse while the
+    file's mtime is unchanged. obj is None if the file isn't valid JSON.
+    """
+    path = LOGS_DIR / name
+    mtime = path.stat().st_mtime_ns
+    cached = _log_cache.get(name)
+    if cached and cached[0] == mtime:
+        _log_cache.move_to_end(name)
+        return cached[1], cached[2]
+    data = path.read_bytes()
+    text = data.decode("utf-8", errors="replace")
+    try:
+        obj = orjson.loads(data)
+    except ValueError:
+        obj = None
+    _log_cache[name] = (mtime, text, obj)
+    if len(_log_cache) > LOG_CACHE_SIZE:
+        _log_cache.popitem(last=False)
+    return text, obj
+
+def _log_status(obj):
+    if obj is None:
+        return "BAD"
+    return "OK" if obj.get("ok") else "ERR"
 
 def show_viewer():
     root = tk.Tk()
@@ -41,9 +76,11 @@ def show_viewer():
     run_btn = tk.Button(btn_frame, text="Run Project", width=12)
     approve_btn = tk.Button(btn_frame, text="Approve Request", width=12)
     refresh_btn = tk.Button(btn_frame, text="Refresh", width=12)
+    more_btn = tk.Button(btn_frame, text="Older Logs", width=12)
     run_btn.pack(side=tk.LEFT, padx=2)
     approve_btn.pack(side=tk.LEFT, padx=2)
     refresh_btn.pack(side=tk.LEFT, padx=2)
+    more_btn.pack(side=tk.LEFT, padx=2)
 
     # right frame: logs and details
     right = tk.Frame(root)
@@ -61,6 +98,7 @@ def show_viewer():
     log_tree.pack(side=tk.LEFT, fill=tk.Y, padx=6, pady=6)
     txt_detail = scrolledtext.ScrolledText(tab_logs)
     txt_detail.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=6, pady=6)
+    log_limit = LOG_PAGE_SIZE
 
     def load_all():
         proj_list.delete(0, tk.END)
@@ -71,10 +109,17 @@ def show_viewer():
             pend_list.insert(tk.END, r.get("request_file"))
 
         log_tree.delete(*log_tree.get_children())
-        for fn, obj in load_logs():
-            status = "OK" if obj.get("ok") else "ERR"
+        for fn, _ in load_logs(log_limit):
+            # status is only known for logs already opened; the rest fill in on select
+            cached = _log_cache.get(fn)
+            status = _log_status(cached[2]) if cached else ""
             log_tree.insert("", tk.END, values=(fn, status))
 
+    def on_more_logs():
+        nonlocal log_limit
+        log_limit += LOG_PAGE_SIZE
+        load_all()
+
     def on_run():
         sel = proj_list.curselection()
         if not sel:
@@ -82,7 +127,7 @@ def show_viewer():
             return
         name = proj_list.get(sel[0])
         res = run_project_by_name(name)
-        messagebox.showinfo("Run result", json.dumps(res, indent=2)[:2000])
+        messagebox.showinfo("Run result", orjson.dumps(res, option=orjson.OPT_INDENT_2).decode()[:2000])
         load_all()
 
     def on_approve():
@@ -92,7 +137,7 @@ def show_viewer():
             return
         reqfile = pend_list.get(sel[0])
         ok = approve_request(reqfile)
-        messagebox.showinfo("Approve", json.dumps(ok, indent=2))
+        messagebox.showinfo("Approve", orjson.dumps(ok, option=orjson.OPT_INDENT_2).decode())
         load_all()
 
     def on_select_log(event):
@@ -101,16 +146,19 @@ def show_viewer():
             return
         item = log_tree.item(sel[0])
         fn = item["values"][0]
-        path = LOGS_DIR / fn
-        if not path.exists():
+        try:
+            text, obj = read_log(fn)
+        except FileNotFoundError:
             txt_detail.delete("1.0", tk.END); txt_detail.insert(tk.END, "missing")
             return
+        log_tree.set(sel[0], "status", _log_status(obj))
         txt_detail.delete("1.0", tk.END)
-        txt_detail.insert(tk.END, path.read_text(encoding="utf-8"))
+        txt_detail.insert(tk.END, text)
 
     run_btn.config(command=on_run)
     approve_btn.config(command=on_approve)
     refresh_btn.config(command=load_all)
+    more_btn.config(command=on_more_logs)
     log_tree.bind("<<TreeviewSelect>>", on_select_log)
 
     load_all()